@@ -0,0 +1,41 @@
+import os
+import sys
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+# ONE-OFF MIGRATION: polling now queries the 'status-index' GSI. Searches saved
+# before that change have no 'status' attribute and would silently stop being polled.
+# This marks every saved search (rows with 'src'; pending OTP rows have none) as ACTIVE.
+#
+# Usage: python backfill_search_status.py [TABLE_NAME]
+#        (defaults to $SEARCH_TABLE, then flight-hunter-ActiveSearches)
+
+table_name = (sys.argv[1] if len(sys.argv) > 1
+              else os.environ.get('SEARCH_TABLE', 'flight-hunter-ActiveSearches'))
+table = boto3.resource('dynamodb').Table(table_name)
+
+kwargs = {
+    'FilterExpression': Attr('src').exists() & Attr('status').not_exists(),
+    'ProjectionExpression': 'contact'
+}
+updated = 0
+while True:
+    response = table.scan(**kwargs)
+    for item in response['Items']:
+        try:
+            table.update_item(
+                Key={'contact': item['contact']},
+                UpdateExpression='SET #s = :active',
+                # Don't clobber a row re-saved (or replaced by an OTP) since the scan
+                ConditionExpression='attribute_exists(src) AND attribute_not_exists(#s)',
+                ExpressionAttributeNames={'#s': 'status'},
+                ExpressionAttributeValues={':active': 'ACTIVE'}
+            )
+            updated += 1
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
+    if 'LastEvaluatedKey' not in response:
+        break
+    kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+print(f"✅ Backfilled status=ACTIVE on {updated} searches in {table_name}")
@@ -1,17 +1,29 @@
 import os
 import random
+import re
 import json
 import time
 import asyncio
+import atexit
+import functools
+import hashlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
 import boto3
-import requests
-import google.generativeai as genai
-from playwright.async_api import async_playwright
-from playwright_stealth import stealth
+from boto3.dynamodb.conditions import Key
+import orjson
+import aiohttp
+from aiolimiter import AsyncLimiter
+from aws_lambda_powertools import Logger
+# google.generativeai and playwright are imported lazily where used to keep cold starts light
 import sys
-      
-search_path = sys.path
-print(search_path)
+
+# Structured JSON logger. DEBUG lines are only emitted when POWERTOOLS_LOG_LEVEL=DEBUG;
+# the happy path writes a single "invocation" record per call (see main_loop)
+logger = Logger(service="flight-hunter")
+logger.debug("Python search path", extra={"sys_path": sys.path})
 
 # --- 1. INITIALIZATION & SECRETS ---
 # Cached clients for reuse across Lambda warm starts
@@ -19,47 +31,159 @@ ssm = boto3.client('ssm')
 dynamodb = boto3.resource('dynamodb')
 sns = boto3.client('sns')
 
-def get_ssm_parameter(name):
-    """Retrieves decrypted secrets from AWS Parameter Store."""
+# Decrypted values are persisted to the container's private /tmp for a short TTL
+SSM_CACHE_PATH = "/tmp/ssm_cache.json"
+SSM_CACHE_TTL = 300 # 5 minutes
+GEMINI_KEY_PATH = "/flights/gemini_key" # Hardcoded path or use env var
+
+def _read_ssm_cache():
     try:
-        response = ssm.get_parameter(Name=name, WithDecryption=True)
-        return response['Parameter']['Value']
-    except Exception as e:
-        print(f"Error fetching SSM parameter {name}: {e}")
+        if time.time() - os.path.getmtime(SSM_CACHE_PATH) < SSM_CACHE_TTL:
+            with open(SSM_CACHE_PATH, 'rb') as f:
+                return orjson.loads(f.read())
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def _write_ssm_cache(values):
+    try:
+        fd = os.open(SSM_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(orjson.dumps(values))
+    except OSError as e:
+        logger.warning(f"Failed to write SSM cache: {e}")
+
+def load_ssm_parameters(names):
+    """Retrieves several decrypted secrets from AWS Parameter Store in one round-trip."""
+    names = [n for n in names if n]
+    values = _read_ssm_cache()
+    missing = [n for n in names if n not in values]
+    if missing:
+        try:
+            response = ssm.get_parameters(Names=missing, WithDecryption=True)
+            values.update({p['Name']: p['Value'] for p in response['Parameters']})
+            for name in response.get('InvalidParameters', []):
+                logger.error(f"Error fetching SSM parameter {name}: not found")
+            _write_ssm_cache(values)
+        except Exception as e:
+            logger.error(f"Error fetching SSM parameters {missing}: {e}")
+    return {n: values.get(n) for n in names}
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Runtime settings, resolved once per container. None means the env var/secret is missing."""
+    rapidapi_key: Optional[str]
+    table_name: Optional[str]
+    sns_topic: Optional[str]
+    gemini_key: Optional[str]
+
+@functools.cache
+def cfg():
+    """Loads environment variables and both secrets (single GetParameters call) on first use."""
+    rapidapi_path = os.environ.get('RAPIDAPI_KEY_PATH')
+    secrets = load_ssm_parameters([rapidapi_path, GEMINI_KEY_PATH])
+    return Config(
+        rapidapi_key=secrets.get(rapidapi_path),
+        table_name=os.environ.get('SEARCH_TABLE'),
+        sns_topic=os.environ.get('SNS_TOPIC_ARN'),
+        gemini_key=secrets.get(GEMINI_KEY_PATH)
+    )
+
+# Gemini Client is initialized on first use, so non-LLM actions skip the setup cost
+@functools.cache
+def _get_gemini():
+    """Returns the configured Gemini model, or None if smart filtering is unavailable."""
+    gemini_key = cfg().gemini_key
+    if not gemini_key:
+        logger.warning("GEMINI_API_KEY not found in SSM. Smart filtering disabled.")
         return None
-
-# Load environment variables (Matches your previous setup)
-RAPIDAPI_KEY = get_ssm_parameter(os.environ.get('RAPIDAPI_KEY_PATH'))
-TABLE_NAME = os.environ.get('SEARCH_TABLE')
-SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
-GEMINI_API_KEY = get_ssm_parameter("/flights/gemini_key") # Hardcoded path or use env var
-
-# Initialize Gemini Client
-gemini_model = None
-if GEMINI_API_KEY:
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
+        import google.generativeai as genai
+        genai.configure(api_key=gemini_key)
         # Gemini 1.5 Flash is efficient and has a free tier
-        gemini_model = genai.GenerativeModel('gemini-1.5-flash', generation_config={"response_mime_type": "application/json"})
-        print("DEBUG: Gemini Client Initialized")
+        model = genai.GenerativeModel('gemini-1.5-flash', generation_config={"response_mime_type": "application/json"})
+        logger.debug("Gemini Client Initialized")
+        return model
     except Exception as e:
-        print(f"WARNING: Failed to init Gemini: {e}")
-else:
-    print("WARNING: GEMINI_API_KEY not found in SSM. Smart filtering disabled.")
+        logger.warning(f"Failed to init Gemini: {e}")
+        return None
 
 # --- 2b. LOGIC: LLM ANALYSIS ---
+# Leading ``` or ```json fence (any case) before an LLM JSON payload
+MARKDOWN_FENCE_RE = re.compile(r'^```(?:json)?\s*', re.IGNORECASE)
+# raw_decode parses the leading JSON value and ignores whatever follows it
+# (a closing fence, a trailing explanation, ...)
+JSON_DECODER = json.JSONDecoder()
+
+# Gemini decisions are cached in /tmp (survives warm invocations), keyed by a hash of the prompt inputs
+GEMINI_CACHE_DIR = "/tmp/gemini_cache"
+# Must comfortably exceed the polling schedule (HourlyRule), or entries from the
+# previous poll expire just before the next one reads them
+GEMINI_CACHE_TTL = int(os.environ.get('GEMINI_CACHE_TTL', '7200')) # 2 hours
+
+def _deal_cache_path(flight_data, user_profile, notes):
+    """
+    Content-hash key. The cached value is Gemini's finished SMS, which quotes the airline
+    and price, so both are keyed exactly: a hit never sends a stale carrier or price.
+    """
+    raw = f"{user_profile.get('src')}|{user_profile.get('dst')}|{notes}|{flight_data.get('airline')}|{flight_data.get('price')}"
+    return os.path.join(GEMINI_CACHE_DIR, f"{hashlib.sha256(raw.encode()).hexdigest()}.json")
+
+def _read_deal_cache(path):
+    try:
+        if time.time() - os.path.getmtime(path) < GEMINI_CACHE_TTL:
+            with open(path, 'rb') as f:
+                cached = orjson.loads(f.read())
+            return cached["s"], cached["m"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def _write_deal_cache(path, should_send, msg_body):
+    try:
+        os.makedirs(GEMINI_CACHE_DIR, exist_ok=True)
+        # Write-then-rename so concurrent polling threads never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps({"s": bool(should_send), "m": msg_body}))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to write Gemini cache: {e}")
+
+def generate_json(gemini_model, prompt):
+    """
+    Streams a JSON-mode Gemini response and returns the parsed object
+    as soon as the buffered chunks form a complete JSON document.
+    """
+    raw_text = ""
+    # response_mime_type is JSON, so chunks are raw JSON and can be parsed directly
+    for chunk in gemini_model.generate_content(prompt, stream=True):
+        raw_text += chunk.text
+        try:
+            result = orjson.loads(raw_text)
+        except orjson.JSONDecodeError:
+            continue
+        logger.debug(f"Gemini Raw Response: {raw_text}")
+        return result
+
+    logger.debug(f"Gemini Raw Response: {raw_text}")
+    # CLEANUP: Remove a leading markdown code fence if present, ignore trailing text
+    result, _ = JSON_DECODER.raw_decode(MARKDOWN_FENCE_RE.sub("", raw_text.strip()).lstrip())
+    return result
+
 def evaluate_flight_deal(flight_data, user_profile, notes):
     """
     Uses Gemini to decide if a flight is worth sending and drafts the SMS.
     Also handles ERROR diagnosis.
     Returns: (bool: should_send, str: message_body)
     """
+    gemini_model = _get_gemini()
     if not gemini_model:
         return True, f"Alert: {flight_data}"
 
     # --- ERROR HANDLING PATH ---
     if "error" in flight_data:
-        print(f"DEBUG: Asking Gemini to explain API Error: {flight_data['error']}")
+        logger.debug(f"Asking Gemini to explain API Error: {flight_data['error']}")
         prompt = f"""
         You are a Backend Reliability Engineer. Use your knowledge to explain this API error.
         Error: "{flight_data['error']}"
@@ -76,14 +200,20 @@ def evaluate_flight_deal(flight_data, user_profile, notes):
 
     # --- HAPPY PATH ---
     if not notes:
-        print(f"DEBUG: Skipping AI analysis (Gemini Active: {bool(gemini_model)}, Notes: {bool(notes)})")
+        logger.debug(f"Skipping AI analysis (Gemini Active: {bool(gemini_model)}, Notes: {bool(notes)})")
         # Fallback: Always send if no LLM or no notes
         default_msg = (f"Flight Alert for {user_profile.get('username')}!\n"
                        f"Route: {user_profile['src']} -> {user_profile['dst']}\n"
                        f"Price: ${flight_data['price']}")
         return True, default_msg
 
-    print(f"DEBUG: Asking Gemini to evaluate deal for {user_profile.get('contact')}")
+    cache_path = _deal_cache_path(flight_data, user_profile, notes)
+    cached = _read_deal_cache(cache_path)
+    if cached:
+        logger.debug(f"Using cached Gemini decision for {user_profile.get('contact')}")
+        return cached
+
+    logger.debug(f"Asking Gemini to evaluate deal for {user_profile.get('contact')}")
     
     prompt = f"""
     You are a travel agent assistant. 
@@ -103,77 +233,171 @@ def evaluate_flight_deal(flight_data, user_profile, notes):
     """
     
     try:
-        response = gemini_model.generate_content(prompt)
-        raw_text = response.text.strip()
-        print(f"DEBUG: Gemini Raw Response: {raw_text}")
-        
-        # CLEANUP: Remove markdown code blocks if present
-        if raw_text.startswith("```"):
-            raw_text = raw_text.replace("```json", "").replace("```", "").strip()
-            
-        result = json.loads(raw_text)
-        return result.get("match", True), result.get("sms", "Deal found!")
+        result = generate_json(gemini_model, prompt)
+        should_send, msg_body = result.get("match", True), result.get("sms", "Deal found!")
+        _write_deal_cache(cache_path, should_send, msg_body)
+        return should_send, msg_body
     except Exception as e:
-        print(f"ERROR: LLM API Call Failed: {e}")
+        logger.error(f"LLM API Call Failed: {e}")
         # Fail open (send the alert anyway)
         return True, f"Deal found! ${flight_data['price']} (AI analysis failed)"
 
 
 # --- 2. LOGIC: PLAYWRIGHT SCRAPER ---
+# Warm browser state, reused across invocations of the same container.
+# Playwright objects are bound to the event loop that created them, so they are
+# only reused while that loop is alive.
+_PW = None
+_BROWSER = None
+_CONTEXT = None
+_BROWSER_LOOP = None
+_PAGE_SLOTS = None
+MAX_PAGES = int(os.environ.get('PLAYWRIGHT_MAX_PAGES', '4')) # Concurrent pages per browser
+# Chromium flags for the long-lived browser inside Lambda: single process, no GPU/sandbox/
+# /dev/shm, no background throttling, capped V8 heap. No --disable-features here:
+# Playwright passes its own list, and a second copy of that switch can replace it.
+_LAUNCH_ARGS = [
+    "--single-process",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--memory-pressure-off",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--js-flags=--max-old-space-size=256"
+]
+
+async def _get_browser():
+    """Lazily launches Chromium and its pre-stealthed context once and returns the warm browser."""
+    global _PW, _BROWSER, _CONTEXT, _BROWSER_LOOP, _PAGE_SLOTS
+    loop = asyncio.get_running_loop()
+    if _BROWSER is not None and _BROWSER_LOOP is loop and _BROWSER.is_connected():
+        return _BROWSER
+
+    if _BROWSER_LOOP is loop:
+        # Same loop but the browser crashed/disconnected: release the old driver first
+        await _close_browser()
+    from playwright.async_api import async_playwright
+    from playwright_stealth import Stealth
+    _PW = await async_playwright().start()
+    _BROWSER = await _PW.chromium.launch(headless=True, args=_LAUNCH_ARGS)
+    # One shared context; stealth is registered once as a context init script
+    # and applies to every page opened from it
+    _CONTEXT = await _BROWSER.new_context(user_agent="Mozilla/5.0...")
+    await Stealth().apply_stealth_async(_CONTEXT)
+    _BROWSER_LOOP = loop
+    # Page pool: caps concurrent pages sharing the single browser process
+    _PAGE_SLOTS = asyncio.Semaphore(MAX_PAGES)
+    logger.debug("Launched warm Chromium instance")
+    return _BROWSER
+
+async def _close_browser():
+    global _PW, _BROWSER, _CONTEXT
+    # Close each step independently: after a crash the context/browser close can raise,
+    # and the Playwright driver process must still be stopped
+    for name, close in (("context", _CONTEXT and _CONTEXT.close),
+                        ("browser", _BROWSER and _BROWSER.close),
+                        ("driver", _PW and _PW.stop)):
+        if close is None:
+            continue
+        try:
+            await close()
+        except Exception as e:
+            logger.warning(f"Failed to close Playwright {name}: {e}")
+    _PW = _BROWSER = _CONTEXT = None
+
+def _shutdown_browser():
+    """Closes the warm browser on interpreter exit, if its loop can still run."""
+    if _BROWSER_LOOP is not None and not _BROWSER_LOOP.is_closed() and not _BROWSER_LOOP.is_running():
+        _BROWSER_LOOP.run_until_complete(_close_browser())
+
+# Best-effort only: runs on a normal interpreter exit (e.g. local scripts). In Lambda,
+# an image without extensions is SIGKILLed on shutdown, so this never runs there.
+atexit.register(_shutdown_browser)
+
 async def scrape_extra_details(url):
     """
     New logic for scraping site details (like Expedia/Google) 
     using the now-working Playwright container environment.
+    Reuses the warm, pre-stealthed context; only a fresh page is created per call.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=["--single-process", "--disable-gpu", "--no-sandbox", "--disable-dev-shm-usage"]
-        )
-        context = await browser.new_context(user_agent="Mozilla/5.0...")
-        page = await context.new_page()
-        await stealth(page)
-        
+    await _get_browser()
+    async with _PAGE_SLOTS:
+        page = await _CONTEXT.new_page()
         try:
-            await page.goto(url, wait_until="networkidle", timeout=60000)
+            # Only the title is read, which is available once the DOM is parsed; waiting for
+            # networkidle on ad/tracker-heavy travel sites can take 15-30s
+            # (a served <title> is already attached by then, so no extra selector wait)
+            await page.goto(url, wait_until="domcontentloaded", timeout=15000)
             title = await page.title()
             return {"site_title": title, "status": "Success"}
         except Exception as e:
-            print(f"Playwright Scraping Error: {e}")
+            logger.error(f"Playwright Scraping Error: {e}")
             return None
         finally:
-            await browser.close()
-
+            # Close the page only; the context and browser stay warm for the next invocation
+            await page.close()
+
+# Fallback/Debug Dictionary (Since API auto-suggest path is elusive)
+# These are common Entity IDs for Skyscanner, keyed by upper-case SkyId
+KNOWN_ENTITIES = {
+    "IAD": "29475437", # Washington Dulles
+    "BLR": "29475359", # Bengaluru
+    "JFK": "29475432", # New York JFK
+    "LHR": "29475430", # London Heathrow
+    "DXB": "29475431"  # Dubai
+}
+
+@functools.lru_cache(maxsize=1024)
 def resolve_entity_id(query):
     """
     Helper to resolve a SkyId/City to an EntityId (required by API).
+    If not in our mini-db, just return the SkyId and hope the API accepts it
+    or that the user enters the EntityId directly.
     """
-    # Corrected Endpoint based on 404 error
-    # Fallback/Debug Dictionary (Since API auto-suggest path is elusive)
-    # These are common Entity IDs for Skyscanner
-    known_entities = {
-        "IAD": "29475437", # Washington Dulles
-        "BLR": "29475359", # Bengaluru
-        "JFK": "29475432", # New York JFK
-        "LHR": "29475430", # London Heathrow
-        "DXB": "29475431"  # Dubai
-    }
-    
-    if query.upper() in known_entities:
-        print(f"DEBUG: Using Hardcoded ID for {query}")
-        return known_entities[query.upper()]
-
-    # If not in our mini-db, just return the SkyId and hope the API accepts it
-    # or that the user enters the EntityId directly.
-    print(f"DEBUG: Could not resolve {query}, using raw code.")
-    return query
+    return KNOWN_ENTITIES.get(query.upper(), query)
 
 # --- 3. LOGIC: FLY-SCRAPER API (Replaces Skyscanner) ---
-def call_skyscanner(search_data):
-    """Calls Fly-Scraper via RapidAPI (New Endpoint provided by user)."""
+# Max concurrent RapidAPI requests per polling batch (mirrors the per-host connection cap)
+RAPIDAPI_CONCURRENCY = 64
+# Token bucket sized slightly below the RapidAPI per-second quota to leave headroom for clock skew
+RAPID_LIMITER = AsyncLimiter(max_rate=2.9, time_period=1.0)
+RAPIDAPI_MAX_ATTEMPTS = 5
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Pooled HTTP session, reused across invocations so keep-alive connections skip the TLS handshake.
+# Like the warm browser, it is bound to the event loop that created it.
+_HTTP = None
+_HTTP_LOOP = None
+
+def _get_http_session():
+    """Returns the pooled aiohttp session, creating it on first use within the running loop."""
+    global _HTTP, _HTTP_LOOP
+    loop = asyncio.get_running_loop()
+    if _HTTP is None or _HTTP.closed or _HTTP_LOOP is not loop:
+        connector = aiohttp.TCPConnector(limit_per_host=RAPIDAPI_CONCURRENCY, ttl_dns_cache=300)
+        _HTTP = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=15))
+        _HTTP_LOOP = loop
+    return _HTTP
+
+async def close_http_session():
+    global _HTTP
+    if _HTTP is not None and not _HTTP.closed:
+        await _HTTP.close()
+    _HTTP = None
+
+def _shutdown_http():
+    """Closes the pooled session on interpreter exit, if its loop can still run."""
+    if _HTTP_LOOP is not None and not _HTTP_LOOP.is_closed() and not _HTTP_LOOP.is_running():
+        _HTTP_LOOP.run_until_complete(close_http_session())
+
+atexit.register(_shutdown_http) # Best-effort, like _shutdown_browser
+
+async def call_skyscanner(search_data):
+    """Calls Fly-Scraper via RapidAPI (New Endpoint provided by user) on the pooled aiohttp session."""
     base_url = "https://fly-scraper.p.rapidapi.com/v2/flights/search-roundtrip"
     headers = {
-        "X-RapidAPI-Key": RAPIDAPI_KEY,
+        "X-RapidAPI-Key": cfg().rapidapi_key,
         "X-RapidAPI-Host": "fly-scraper.p.rapidapi.com"
     }
 
@@ -193,42 +417,59 @@ def call_skyscanner(search_data):
         "market": "US"
     }
     
+    # aiohttp (unlike requests) rejects None and non-str/int values such as DynamoDB Decimals
+    querystring = {k: str(v) for k, v in querystring.items() if v is not None}
+    
     try:
-        print(f"DEBUG: Calling Fly-Scraper API: {querystring}")
-        response = requests.get(base_url, headers=headers, params=querystring)
+        logger.debug(f"Calling Fly-Scraper API: {querystring}")
+        session = _get_http_session()
+        for attempt in range(RAPIDAPI_MAX_ATTEMPTS):
+            try:
+                async with RAPID_LIMITER:
+                    async with session.get(base_url, headers=headers, params=querystring) as response:
+                        status = response.status
+                        if status == 200:
+                            data = await response.json(loads=orjson.loads)
+                        else:
+                            text = await response.text()
+            except aiohttp.ClientConnectionError as e:
+                # Pooled keep-alive connections can go stale while the container is frozen
+                if attempt == RAPIDAPI_MAX_ATTEMPTS - 1:
+                    raise
+                status, text = None, str(e)
+            
+            if (status is not None and status not in RETRYABLE_STATUSES) or attempt == RAPIDAPI_MAX_ATTEMPTS - 1:
+                break
+            # Exponential backoff with jitter on throttling / transient upstream errors
+            logger.warning(f"API {status or text}, retrying (attempt {attempt + 1}/{RAPIDAPI_MAX_ATTEMPTS})")
+            await asyncio.sleep(2 ** attempt + random.random())
         
-        if response.status_code == 200:
-            data = response.json()
-            # print(f"DEBUG: RAW API RESPONSE: {str(data)[:500]}") # Debugging
+        if status == 200:
+            # logger.debug(f"RAW API RESPONSE: {str(data)[:500]}") # Debugging
             
             # PARSING LOGIC FOR FLY-SCRAPER
             # Usually: data -> data -> itineraries
-            api_data = data.get('data', {})
-            itineraries = api_data.get('itineraries', [])
+            # Hot path: direct subscripts, with a missing/empty branch meaning "no flights"
+            try:
+                best_deal = data['data']['itineraries'][0]
+                price_info = best_deal['price']
+                price_scraped = price_info.get('formatted') or f"${price_info['raw']}"
+            except (KeyError, IndexError, TypeError):
+                return {"error": "API Success but 0 flights found."}
             
-            if itineraries:
-                best_deal = itineraries[0]
-                # Price parsing depends on API. Usually valid for this scraper:
-                price_info = best_deal.get('price', {})
-                price_scraped = price_info.get('formatted') or f"${price_info.get('raw')}"
-                
-                # Airline parsing
-                legs = best_deal.get('legs', [])
+            # Airline parsing
+            try:
+                airline_Name = best_deal['legs'][0]['carriers']['marketing'][0]['name']
+            except (KeyError, IndexError, TypeError):
                 airline_Name = "Unknown"
-                if legs:
-                    carriers = legs[0].get('carriers', {}).get('marketing', [])
-                    if carriers:
-                        airline_Name = carriers[0].get('name')
 
-                return {"price": price_scraped, "airline": airline_Name, "link": "N/A"}
-            else:
-                return {"error": "API Success but 0 flights found."}
+            return {"price": price_scraped, "airline": airline_Name, "link": "N/A"}
         else:
-            print(f"ERROR: API Failed: {response.text}")
-            return {"error": f"API {response.status_code}: {response.text}"}
+            logger.error(f"API Failed: {text}")
+            return {"error": f"API {status}: {text}"}
 
     except Exception as e:
-        print(f"ERROR: API Function Exception: {e}")
+        logger.error(f"API Function Exception: {e}")
         return {"error": f"Internal Error: {str(e)}"}
 
 # --- 4. MAIN HANDLER ---
@@ -248,9 +489,9 @@ def handle_send_otp(body, table):
     # Send SMS via SNS
     try:
         sns.publish(PhoneNumber=contact, Message=f"Your Flight Hunter verification code is: {otp_code}")
-        print(f"DEBUG: OTP {otp_code} Sent to {contact} via SNS")
+        logger.debug(f"OTP {otp_code} Sent to {contact} via SNS")
     except Exception as e:
-        print(f"WARNING: SMS Failed: {e}. Returning Debug OTP.")
+        logger.warning(f"SMS Failed: {e}. Returning Debug OTP.")
     
     return create_response(200, {"message": "OTP Sent", "debug_otp": otp_code})
 
@@ -284,59 +525,168 @@ def handle_verify_otp(body, table):
         'cabinClass': body.get('cabinClass', 'economy'),
         'stops': body.get('stops', 'direct,1stop,2stops'),
         'notes': body.get('notes', ''), # Crucial for Gemini
+        'status': 'ACTIVE', # Partition key of the polling index
         'timestamp': int(time.time()),
         'ttl': int(time.time()) + (86400 * 7) # Expire in 7 days
     }
     
     table.put_item(Item=item)
-    print(f"DEBUG: OTP Valid. Saved Search: {item}")
+    logger.debug(f"OTP Valid. Saved Search: {item}")
     return create_response(200, {"message": "Verified! Search active."})
 
 def handle_analyze_request(body):
     analysis = analyze_flight_request(body)
     return create_response(200, analysis)
 
-def handle_polling(table):
-    active_searches = table.scan()['Items']
-    print(f"POLLING: Found {len(active_searches)} active searches.")
+async def poll_search(search, semaphore):
+    """Fetches and evaluates a single active search. Returns the alert body, or None if filtered."""
+    async with semaphore:
+        sky_result = await call_skyscanner(search)
 
-    for search in active_searches:
-        sky_result = call_skyscanner(search)
+    if sky_result:
+        # Gemini is a blocking SDK call; keep it off the event loop
+        should_send, msg_body = await asyncio.to_thread(
+            evaluate_flight_deal, sky_result, search, search.get('notes', ''))
         
-        if sky_result:
-            should_send, msg_body = evaluate_flight_deal(sky_result, search, search.get('notes', ''))
-            
-            if should_send:
-                sns.publish(
-                    TopicArn=SNS_TOPIC_ARN, 
-                    Message=msg_body, 
-                    Subject="Flight Hunter Alert"
-                )
-                print(f"Alert sent to {search.get('contact')}")
+        if should_send:
+            return msg_body
+        logger.debug(f"Filtered by AI: {sky_result['price']}")
+    return None
+
+# SNS PublishBatch accepts at most 10 entries per call
+SNS_BATCH_SIZE = 10
+
+def publish_alerts(alerts):
+    """
+    Publishes (contact, message) alerts to the SNS topic in batches of SNS_BATCH_SIZE.
+    Returns the number of alerts successfully sent.
+    """
+    sent = 0
+    for start in range(0, len(alerts), SNS_BATCH_SIZE):
+        batch = alerts[start:start + SNS_BATCH_SIZE]
+        entries = [
+            {"Id": str(start + i), "Message": msg_body, "Subject": "Flight Hunter Alert"}
+            for i, (_, msg_body) in enumerate(batch)
+        ]
+        try:
+            response = sns.publish_batch(TopicArn=cfg().sns_topic, PublishBatchRequestEntries=entries)
+        except Exception as e:
+            logger.error(f"SNS batch publish failed: {e}")
+            continue
+        failed = {f['Id']: f for f in response.get('Failed', [])}
+        for i, (contact, _) in enumerate(batch):
+            failure = failed.get(str(start + i))
+            if failure:
+                logger.error(f"Alert to {contact} failed: {failure.get('Code')} {failure.get('Message')}")
             else:
-                print(f"Filtered by AI: {sky_result['price']}")
+                logger.debug(f"Alert sent to {contact}")
+                sent += 1
+    return sent
+
+# Sparse GSI on 'status': only saved searches (not pending OTP rows) are indexed,
+# so polling cost scales with active searches rather than table size
+STATUS_INDEX = "status-index"
+# Only the attributes needed to call the API and evaluate the deal
+POLLING_PROJECTION = "contact,src,dst,#d,#r,adults,children,infants,cabinClass,notes,username,#t"
+POLLING_ATTRIBUTE_NAMES = {'#d': 'date', '#r': 'return', '#t': 'ttl'} # Reserved words in DynamoDB
+
+def query_active_searches(table):
+    """Queries the status index for ACTIVE searches, following LastEvaluatedKey pagination."""
+    kwargs = {
+        'IndexName': STATUS_INDEX,
+        'KeyConditionExpression': Key('status').eq('ACTIVE'),
+        'ProjectionExpression': POLLING_PROJECTION,
+        'ExpressionAttributeNames': dict(POLLING_ATTRIBUTE_NAMES)
+    }
+    items = []
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # DynamoDB TTL deletion is lazy; drop rows that have expired but not been swept yet
+    now = int(time.time())
+    return [item for item in items if int(item.get('ttl', 0)) > now]
+
+async def handle_polling(table, stages):
+    with _timed(stages, "query"):
+        active_searches = await asyncio.to_thread(query_active_searches, table)
+
+    # Fan out all searches concurrently over the pooled session
+    semaphore = asyncio.Semaphore(RAPIDAPI_CONCURRENCY)
+    with _timed(stages, "fetch_evaluate"):
+        results = await asyncio.gather(
+            *[poll_search(search, semaphore) for search in active_searches],
+            return_exceptions=True
+        )
+
+    alerts = []
+    for search, result in zip(active_searches, results):
+        if isinstance(result, Exception):
+            logger.error(f"Polling failed for {search.get('contact')}: {result}")
+        elif result:
+            alerts.append((search.get('contact'), result))
+
+    # SNS is a blocking SDK call; keep it off the event loop
+    with _timed(stages, "publish"):
+        sent = await asyncio.to_thread(publish_alerts, alerts)
+
+    # Summary fields land on the single per-invocation log record
+    logger.append_keys(active_searches=len(active_searches), alerts_matched=len(alerts), alerts_sent=sent)
 
     return create_response(200, {"status": "Batch polling completed"})
 
 
 # --- 5. MAIN ENTRY POINT ---
+# One event loop for the container's lifetime: asyncio.run() would close it after every
+# invocation, taking the warm browser and pooled HTTP session down with it
+try:
+    import uvloop
+    _LOOP = uvloop.new_event_loop()
+except ImportError:
+    _LOOP = asyncio.new_event_loop()
+asyncio.set_event_loop(_LOOP)
+
+@contextmanager
+def _timed(stages, name):
+    """Records the wall time of a block, in ms, under stages[name]."""
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        stages[name] = round((time.perf_counter_ns() - start) / 1e6, 2)
+
+# clear_state drops keys appended by the previous invocation on a warm container
+@logger.inject_lambda_context(clear_state=True)
 def lambda_handler(event, context):
-    return asyncio.run(main_loop(event))
+    return _LOOP.run_until_complete(main_loop(event))
 
 async def main_loop(event):
-    print(f"DEBUG: Received event: {json.dumps(event)}")
+    """Routes the event, then emits one structured log record for the whole invocation."""
+    stages = {}
+    try:
+        with _timed(stages, "total"):
+            return await route_event(event, stages)
+    finally:
+        logger.info("invocation", extra={"stages_ms": stages})
+
+async def route_event(event, stages):
+    logger.debug("Received event", extra={"event": event})
 
     # 1. CORS Preflight
     if event.get("httpMethod") == "OPTIONS":
         return create_response(200, {"message": "CORS OK"})
 
-    table = dynamodb.Table(TABLE_NAME)
+    table = dynamodb.Table(cfg().table_name)
     
     # 2. Logic Router
     if "body" in event:
         try:
-            body = json.loads(event["body"])
+            body = orjson.loads(event["body"])
             action = body.get("action")
+            logger.append_keys(action=action)
             
             if action == "SEND_OTP":        return handle_send_otp(body, table)
             elif action == "SCRAPE_ONE":    return await handle_scrape_one(body)
@@ -345,20 +695,24 @@ async def main_loop(event):
             else: return create_response(400, {"message": "Invalid action"})
             
         except Exception as e:
-            print(f"CRITICAL ERROR: {str(e)}")
+            logger.exception(f"CRITICAL ERROR: {str(e)}")
             return create_response(500, {"message": str(e)})
 
     # 3. Scheduled Event (No body) -> Polling
-    return handle_polling(table)
+    logger.append_keys(action="POLLING")
+    return await handle_polling(table, stages)
+
+# Shared by every response; built once instead of per call
+_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "POST,OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization"
+}
 
 def create_response(status_code, body):
     return {
         "statusCode": status_code,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "POST,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization"
-        },
-        "body": json.dumps(body)
+        "headers": _HEADERS,
+        "body": orjson.dumps(body).decode() # API Gateway expects a str body
     }
\ No newline at end of file
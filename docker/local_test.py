@@ -1,5 +1,6 @@
 import os
 import sys
+import asyncio
 
 # MOCK ENVIRONMENT VARIABLES (Must be done BEFORE importing lambda_function)
 # These simulate what Docker/Lambda would provide
@@ -17,8 +18,13 @@ MY_RAPIDAPI_KEY = ""
 MY_GEMINI_KEY = ""
 
 # Monkey Patch: Force the lambda module to use these keys instead of SSM
-lambda_function.RAPIDAPI_KEY = MY_RAPIDAPI_KEY
-lambda_function.GEMINI_API_KEY = MY_GEMINI_KEY
+local_config = lambda_function.Config(
+    rapidapi_key=MY_RAPIDAPI_KEY,
+    table_name=os.environ['SEARCH_TABLE'],
+    sns_topic=os.environ['SNS_TOPIC_ARN'],
+    gemini_key=MY_GEMINI_KEY
+)
+lambda_function.cfg = lambda: local_config
 
 # Re-initialize Gemini with the new key if present
 if MY_GEMINI_KEY and "PASTE" not in MY_GEMINI_KEY:
@@ -33,11 +39,10 @@ if MY_GEMINI_KEY and "PASTE" not in MY_GEMINI_KEY:
             
     # Attempt to use the first available 'gemini' model if pro fails?
     # For now, let's just stick to pro and see the list output.
-    lambda_function.gemini_model = genai.GenerativeModel('gemini-flash-latest') 
+    local_model = genai.GenerativeModel('gemini-flash-latest')
+    lambda_function._get_gemini = lambda: local_model
     print("DEBUG: Gemini Client Re-Initialized for Local Test")
 
-import time # Import time for rate limiting
-
 test_search = {
     "src": "IAD",
     "dst": "BLR",
@@ -52,13 +57,11 @@ test_search = {
 # Ensure Environment Variables are set (or mock them)
 # You need to export RAPIDAPI_KEY_PATH, etc. or set them here if your code reads env vars directly.
 # However, your code uses SSM. If you have valid AWS credentials in your terminal, it might just work.
-# If not, you might need to mock get_ssm_parameter.
+# If not, patch lambda_function.cfg (as done above).
 
 print("--- 1. Testing Entity Resolution ---")
 origin_id = resolve_entity_id(test_search['src'])
-time.sleep(1.5) # Avoid RapidAPI 429 Rate Limit
 dest_id = resolve_entity_id(test_search['dst'])
-time.sleep(1.5) # Avoid RapidAPI 429 Rate Limit
 print(f"Resolved IAD -> {origin_id}")
 print(f"Resolved BLR -> {dest_id}")
 
@@ -67,7 +70,13 @@ if not origin_id or not dest_id:
     exit(1)
 
 print("\n--- 2. Testing Skyscanner API ---")
-flight_result = call_skyscanner(test_search)
+async def fetch_flight(search):
+    try:
+        return await call_skyscanner(search)
+    finally:
+        await lambda_function.close_http_session()
+
+flight_result = asyncio.run(fetch_flight(test_search))
 if flight_result:
     print(f"✅ Flight Found: {flight_result}")
 else: